@@ -3,18 +3,31 @@ YouTube Video Downloader - Flask Backend
 Features: Multi-quality download, video preview, dynamic retention policy
 """
 
+import atexit
+import copy
+import errno
+import heapq
+import json
+import mimetypes
 import os
+import queue
 import re
-import sqlite3
+import shutil
 import threading
 import time
+import unicodedata
 import uuid
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from concurrent.futures import Future
 from datetime import datetime, timedelta
+from operator import itemgetter
 from pathlib import Path
+from urllib.parse import quote
 
 import yt_dlp
-from flask import Flask, jsonify, render_template, request, send_file
+from flask import Flask, Response, jsonify, render_template, request, send_file
+
+from db import DBPool
 
 # =============================================================================
 # Configuration
@@ -30,11 +43,165 @@ COOKIES_PATH = BASE_DIR / "cookies.txt"
 DOWNLOADED_DIR.mkdir(exist_ok=True)
 CONVERTED_DIR.mkdir(exist_ok=True)
 
-# Thread pool for background downloads
-executor = ThreadPoolExecutor(max_workers=3)
+# Shared SQLite connections (1 writer + 4 readers)
+db_pool = DBPool(DATABASE_PATH, readers=4)
+
+# Download records waiting for the writer thread: (UPSERT_DOWNLOAD_SQL params, Future)
+_WRITE_Q = queue.SimpleQueue()
+WRITE_BATCH_SIZE = 32
+
+# Live status subscribers for /events: {task_id: [queue.SimpleQueue, ...]}
+_task_channels = {}
+_task_channels_lock = threading.Lock()
+SSE_KEEPALIVE = 15  # seconds between keep-alive comments on an idle stream
+
+# =============================================================================
+# Task Tracking
+# =============================================================================
+
+MAX_TASKS = 1024              # In-memory tasks kept before LRU eviction
+FINISHED_TASK_TTL = 60 * 60   # Ready/error tasks dropped after 1 hour
+TASK_SWEEP_INTERVAL = 5 * 60  # Seconds between sweeps
+
+class LRUDict(OrderedDict):
+    """
+    Dict capped at maxlen entries. Reads and writes mark an entry as most
+    recently used; inserting past maxlen evicts the least recently used
+    entry for which evictable(value) is true. If none qualifies the dict
+    grows past maxlen until one does.
+    """
+
+    def __init__(self, maxlen, evictable=None):
+        super().__init__()
+        self.maxlen = maxlen
+        self.evictable = evictable
+        self.lock = threading.RLock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
 
-# In-memory task status tracking
-tasks = {}
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self:
+                return default
+            return self[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            overflow = len(self) - self.maxlen
+            if overflow <= 0:
+                return
+            if self.evictable is None:
+                victims = list(self)[:overflow]
+            else:
+                victims = [k for k, v in self.items() if self.evictable(v)][:overflow]
+            for victim in victims:
+                super().__delitem__(victim)
+
+def is_finished_task(task):
+    """True once a task is ready or failed (safe to evict)."""
+    return task['status'] in ('ready', 'error')
+
+# In-memory task status tracking. Only finished tasks are evicted; they are
+# still answered from the database by /status and /file. Tasks can be
+# removed by other threads, so read them once with tasks.get().
+tasks = LRUDict(maxlen=MAX_TASKS, evictable=is_finished_task)
+
+# Task IDs are the first 8 hex chars of a uuid4
+_TASK_ID_RE = re.compile(r'[0-9a-f]{8}')
+
+# Recent /status lookups that missed both memory and the database:
+# {task_id: missed_at}. Short TTL, since a record can land after a miss.
+MISS_CACHE_TTL = 30
+_MISS_CACHE = LRUDict(maxlen=4096)
+
+# Raw yt-dlp extraction results by video_id: {video_id: (fetched_at, info)}
+# Lets /download reuse what /info already fetched instead of a second roundtrip.
+# Raw info dicts are large, so the cache is capped as well as aged out.
+INFO_CACHE_TTL = 600  # 10 minutes
+INFO_CACHE_SIZE = 128
+_INFO_CACHE = LRUDict(maxlen=INFO_CACHE_SIZE)
+
+def sweep_finished_tasks():
+    """Drop ready/error tasks that finished more than FINISHED_TASK_TTL ago."""
+    cutoff = time.time() - FINISHED_TASK_TTL
+    with tasks.lock:
+        stale = [
+            task_id for task_id, task in tasks.items()
+            if is_finished_task(task) and task.get('finished_at', cutoff) < cutoff
+        ]
+        for task_id in stale:
+            del tasks[task_id]
+
+def _sweeper_loop():
+    while True:
+        time.sleep(TASK_SWEEP_INTERVAL)
+        sweep_finished_tasks()
+
+threading.Thread(target=_sweeper_loop, daemon=True).start()
+
+# =============================================================================
+# Worker Pool
+# =============================================================================
+
+class WorkerPool:
+    """
+    Fixed set of daemon threads, each with its own deque.
+    submit() pushes onto the shortest deque; an idle worker pops from its
+    own head and otherwise steals from the tail of another worker's deque.
+    """
+
+    def __init__(self, workers=3):
+        self._queues = [deque() for _ in range(workers)]
+        self._locks = [threading.Lock() for _ in range(workers)]
+        # Counts queued jobs across all deques; a worker that acquires it
+        # is guaranteed to find one job somewhere.
+        self._pending = threading.Semaphore(0)
+        for i in range(workers):
+            threading.Thread(target=self._run, args=(i,), daemon=True).start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); returns a Future for its result."""
+        future = Future()
+        i = min(range(len(self._queues)), key=lambda n: len(self._queues[n]))
+        with self._locks[i]:
+            self._queues[i].append((future, fn, args, kwargs))
+        self._pending.release()
+        return future
+
+    def _take(self, i):
+        with self._locks[i]:
+            if self._queues[i]:
+                return self._queues[i].popleft()
+        n = len(self._queues)
+        for j in range(i + 1, i + n):
+            j %= n
+            with self._locks[j]:
+                if self._queues[j]:
+                    return self._queues[j].pop()
+        return None
+
+    def _run(self, i):
+        while True:
+            self._pending.acquire()
+            job = None
+            while job is None:
+                job = self._take(i)
+            future, fn, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+# Worker pool for background downloads
+executor = WorkerPool(workers=3)
 
 # =============================================================================
 # Flask App
@@ -48,67 +215,122 @@ app = Flask(__name__)
 
 def init_db():
     """Initialize SQLite database with downloads table."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS downloads (
-            id TEXT PRIMARY KEY,
-            video_id TEXT,
-            title TEXT,
-            filepath TEXT,
-            duration_seconds INTEGER,
-            expiry_timestamp REAL,
-            format_info TEXT,
-            status TEXT,
-            created_at REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with db_pool.writer() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS downloads (
+                id TEXT PRIMARY KEY,
+                video_id TEXT,
+                title TEXT,
+                filepath TEXT,
+                duration_seconds INTEGER,
+                expiry_timestamp REAL,
+                format_info TEXT,
+                status TEXT,
+                created_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_expiry ON downloads(expiry_timestamp)')
+
+# Upsert updates an existing row in place (INSERT OR REPLACE deletes and re-inserts)
+UPSERT_DOWNLOAD_SQL = '''
+    INSERT INTO downloads 
+    (id, video_id, title, filepath, duration_seconds, expiry_timestamp, format_info, status, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        video_id = excluded.video_id,
+        title = excluded.title,
+        filepath = excluded.filepath,
+        duration_seconds = excluded.duration_seconds,
+        expiry_timestamp = excluded.expiry_timestamp,
+        format_info = excluded.format_info,
+        status = excluded.status
+'''
+
+def download_record_params(task_id, video_id, title, filepath, duration_seconds, format_info):
+    """Build UPSERT_DOWNLOAD_SQL parameters; expiry_timestamp is at index 5."""
+    now = time.time()
+    expiry_timestamp = now + calculate_expiry(duration_seconds)
+    return (task_id, video_id, title, filepath, duration_seconds, expiry_timestamp, format_info, 'ready', now)
 
 def save_download_record(task_id, video_id, title, filepath, duration_seconds, format_info):
-    """Save download record with calculated expiry."""
-    expiry_seconds = calculate_expiry(duration_seconds)
-    expiry_timestamp = time.time() + expiry_seconds
-    
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO downloads 
-        (id, video_id, title, filepath, duration_seconds, expiry_timestamp, format_info, status, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (task_id, video_id, title, filepath, duration_seconds, expiry_timestamp, format_info, 'ready', time.time()))
-    conn.commit()
-    conn.close()
-    
-    return expiry_timestamp
+    """
+    Queue download record for the writer thread, which commits it in a
+    batched transaction. Returns a Future resolving to the calculated
+    expiry once the row is committed, or raising if the write failed.
+    """
+    params = download_record_params(task_id, video_id, title, filepath, duration_seconds, format_info)
+    future = Future()
+    _WRITE_Q.put((params, future))
+    return future
+
+def _write_batch(batch):
+    """Upsert a batch of queued (params, future) items in one transaction."""
+    try:
+        with db_pool.writer() as conn:
+            conn.executemany(UPSERT_DOWNLOAD_SQL, [params for params, _ in batch])
+    except Exception as e:
+        app.logger.exception(f"Failed to save {len(batch)} download record(s)")
+        for _, future in batch:
+            future.set_exception(e)
+        return
+    for params, future in batch:
+        future.set_result(params[5])
+
+def _writer_loop():
+    """Drain queued records and commit them in batches until the None sentinel."""
+    while True:
+        batch = []
+        item = _WRITE_Q.get()
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= WRITE_BATCH_SIZE:
+                break
+            try:
+                item = _WRITE_Q.get_nowait()
+            except queue.Empty:
+                break
+        if batch:
+            _write_batch(batch)
+        if item is None:
+            return
+
+def _flush_writes():
+    """On shutdown, let the writer finish and commit anything still queued."""
+    _WRITE_Q.put(None)
+    _writer_thread.join(timeout=10)
+    batch = []
+    while True:
+        try:
+            item = _WRITE_Q.get_nowait()
+        except queue.Empty:
+            break
+        if item is not None:
+            batch.append(item)
+    if batch:
+        _write_batch(batch)
+
+# Single long-lived writer for download records, flushed at interpreter exit
+_writer_thread = threading.Thread(target=_writer_loop, daemon=True)
+_writer_thread.start()
+atexit.register(_flush_writes)
 
 def get_download_record(task_id):
     """Get download record by task ID."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM downloads WHERE id = ?', (task_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with db_pool.reader() as conn:
+        row = conn.execute('SELECT * FROM downloads WHERE id = ?', (task_id,)).fetchone()
     
-    if row:
-        return {
-            'id': row[0],
-            'video_id': row[1],
-            'title': row[2],
-            'filepath': row[3],
-            'duration_seconds': row[4],
-            'expiry_timestamp': row[5],
-            'format_info': row[6],
-            'status': row[7],
-            'created_at': row[8]
-        }
-    return None
+    return dict(row) if row else None
 
 # =============================================================================
 # Utility Functions
 # =============================================================================
 
+# Video ID from watch, /v/, youtu.be, embed and shorts URLs
+_VIDEO_ID_RE = re.compile(r'(?:v=|/v/|youtu\.be/|embed/|shorts/)([a-zA-Z0-9_-]{11})')
+
+# Characters stripped from titles when building filenames
+_SAFE_TITLE_RE = re.compile(r'[^\w\s-]')
+
 def calculate_expiry(duration_seconds):
     """
     Calculate retention time: MAX(2 hours, video duration)
@@ -119,19 +341,16 @@ def calculate_expiry(duration_seconds):
 
 def extract_video_id(url):
     """Extract YouTube video ID from various URL formats."""
-    patterns = [
-        r'(?:v=|/v/|youtu\.be/)([a-zA-Z0-9_-]{11})',
-        r'(?:embed/)([a-zA-Z0-9_-]{11})',
-        r'(?:shorts/)([a-zA-Z0-9_-]{11})',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    return None
-
-def get_yt_dlp_opts(cookies=True):
-    """Get base yt-dlp options."""
+    match = _VIDEO_ID_RE.search(url)
+    return match.group(1) if match else None
+
+def get_yt_dlp_opts(cookies=True, fast=False):
+    """
+    Get base yt-dlp options.
+    fast: metadata-only extraction for /info (no DASH manifest, comments,
+    subtitles, watch page or player configs). Never the sole basis for a
+    download; see fetch_video_info.
+    """
     opts = {
         'quiet': True,
         'no_warnings': True,
@@ -139,6 +358,13 @@ def get_yt_dlp_opts(cookies=True):
         'noplaylist': True,  # Only download single video, not playlist
         'ffmpeg_location': '/usr/bin',  # Explicit path to ffmpeg/ffprobe
     }
+    if fast:
+        opts.update({
+            'youtube_include_dash_manifest': False,
+            'getcomments': False,
+            'writesubtitles': False,
+            'extractor_args': {'youtube': {'player_skip': ['configs', 'webpage']}},
+        })
     if cookies and COOKIES_PATH.exists():
         opts['cookiefile'] = str(COOKIES_PATH)
     return opts
@@ -150,6 +376,15 @@ def clean_youtube_url(url):
         return f'https://www.youtube.com/watch?v={video_id}'
     return url
 
+def content_disposition_params(download_name):
+    """Content-Disposition filename params, with an RFC 5987 fallback for non-ASCII names."""
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='')}"}
+    return {'filename': download_name}
+
 def format_duration(seconds):
     """Format duration in human-readable format."""
     if not seconds:
@@ -164,65 +399,105 @@ def format_duration(seconds):
 # Video Info & Format Extraction
 # =============================================================================
 
+def cache_video_info(video_id, info):
+    """Store an unprocessed extraction result, evicting stale entries."""
+    now = time.time()
+    with _INFO_CACHE.lock:
+        stale = [k for k, (fetched_at, _) in _INFO_CACHE.items() if now - fetched_at > INFO_CACHE_TTL]
+        for k in stale:
+            del _INFO_CACHE[k]
+        _INFO_CACHE[video_id] = (now, info)
+
+def get_cached_video_info(video_id):
+    """Return a private copy of a fresh cached extraction result, or None."""
+    entry = _INFO_CACHE.get(video_id)
+    if not entry or time.time() - entry[0] > INFO_CACHE_TTL:
+        return None
+    # yt-dlp mutates the dict while selecting formats
+    return copy.deepcopy(entry[1])
+
+def drop_cached_video_info(video_id):
+    """Forget a cached extraction result (e.g. after it failed to download)."""
+    with _INFO_CACHE.lock:
+        _INFO_CACHE.pop(video_id, None)
+
 def fetch_video_info(url):
     """Fetch video info and available formats from YouTube."""
-    opts = get_yt_dlp_opts()
+    opts = get_yt_dlp_opts(fast=True)
     opts['skip_download'] = True
     
     with yt_dlp.YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+        # Extract without processing so the raw result can be cached and
+        # later processed again for download. This is a fast-mode result
+        # (skipped formats are possible), so download_video only treats it as
+        # a first attempt: any YoutubeDLError from it, including the
+        # ExtractorError for an unavailable format, drops the entry and
+        # falls back to a full extraction. Live/post-live streams rely on the
+        # DASH manifest fast mode skips, so those are never cached.
+        raw_info = ydl.extract_info(url, download=False, process=False)
+        if raw_info.get('live_status') in (None, 'not_live'):
+            cache_video_info(raw_info.get('id'), raw_info)
+        info = ydl.process_ie_result(copy.deepcopy(raw_info), download=False)
     
     # Extract available video qualities
     formats = info.get('formats', [])
     
-    # Group formats by resolution
+    # Group formats by resolution (keyed by height until labelled below)
     video_formats = {}
     audio_formats = []
     
+    no_codec = 'none'  # yt-dlp's marker for an absent video/audio stream
+    append_audio = audio_formats.append
+    
     for fmt in formats:
+        get = fmt.get
+        format_id = get('format_id')
         # Skip formats without proper info
-        if not fmt.get('format_id'):
+        if not format_id:
             continue
         
-        height = fmt.get('height')
-        vcodec = fmt.get('vcodec', 'none')
-        acodec = fmt.get('acodec', 'none')
-        ext = fmt.get('ext', 'unknown')
-        filesize = fmt.get('filesize') or fmt.get('filesize_approx') or 0
+        height, vcodec, acodec = get('height'), get('vcodec', no_codec), get('acodec', no_codec)
+        has_video = vcodec != no_codec
         
         # Video formats (with video codec)
-        if height and vcodec != 'none':
-            quality_label = f"{height}p"
-            if quality_label not in video_formats:
-                video_formats[quality_label] = {
+        if height and has_video:
+            group = video_formats.get(height)
+            if group is None:
+                group = video_formats[height] = {
                     'height': height,
                     'formats': []
                 }
-            video_formats[quality_label]['formats'].append({
-                'format_id': fmt.get('format_id'),
-                'ext': ext,
+            group['formats'].append({
+                'format_id': format_id,
+                'ext': get('ext', 'unknown'),
                 'vcodec': vcodec,
                 'acodec': acodec,
-                'filesize': filesize,
-                'fps': fmt.get('fps', 30),
-                'tbr': fmt.get('tbr', 0),  # Total bitrate
+                'filesize': get('filesize') or get('filesize_approx') or 0,
+                'fps': get('fps', 30),
+                'tbr': get('tbr', 0),  # Total bitrate
             })
         
         # Audio-only formats
-        elif acodec != 'none' and vcodec == 'none':
-            audio_formats.append({
-                'format_id': fmt.get('format_id'),
-                'ext': ext,
+        elif not has_video and acodec != no_codec:
+            append_audio({
+                'format_id': format_id,
+                'ext': get('ext', 'unknown'),
                 'acodec': acodec,
-                'abr': fmt.get('abr', 0),  # Audio bitrate
-                'filesize': filesize,
+                'abr': get('abr') or 0,  # Audio bitrate
+                'filesize': get('filesize') or get('filesize_approx') or 0,
             })
     
-    # Sort video qualities by height (descending)
-    sorted_qualities = sorted(video_formats.keys(), key=lambda x: int(x.replace('p', '')), reverse=True)
+    # Label groups once, highest resolution first
+    video_formats = {
+        f"{height}p": video_formats[height]
+        for height in sorted(video_formats, reverse=True)
+    }
+    
+    # Video qualities by height (descending)
+    sorted_qualities = list(video_formats)
     
-    # Sort audio by bitrate (descending)
-    audio_formats.sort(key=lambda x: x.get('abr', 0), reverse=True)
+    # Top 5 audio formats by bitrate (descending)
+    top_audio = heapq.nlargest(5, audio_formats, key=itemgetter('abr'))
     
     return {
         'video_id': info.get('id'),
@@ -234,22 +509,69 @@ def fetch_video_info(url):
         'view_count': info.get('view_count'),
         'qualities': sorted_qualities,
         'video_formats': video_formats,
-        'audio_formats': audio_formats[:5],  # Top 5 audio formats
+        'audio_formats': top_audio,
     }
 
+# =============================================================================
+# Task Status & Events
+# =============================================================================
+
+def build_task_status(task):
+    """Client-facing status payload for an in-memory task."""
+    response = {
+        'status': task['status'],
+        'progress': task.get('progress', 0),
+    }
+    
+    if task['status'] == 'ready':
+        response['title'] = task.get('title')
+        response['filename'] = task.get('filename')
+        response['expiry'] = task.get('expiry')
+    elif task['status'] == 'error':
+        response['error'] = task.get('error')
+    
+    return response
+
+def publish_task_update(task_id, task):
+    """Push the task's current status to every /events subscriber."""
+    with _task_channels_lock:
+        channels = list(_task_channels.get(task_id, ()))
+    if not channels:
+        return
+    message = build_task_status(task)
+    for channel in channels:
+        channel.put_nowait(message)
+
 # =============================================================================
 # Download Functions
 # =============================================================================
 
+def remove_partial_downloads(task_id):
+    """Delete whatever a failed attempt left in downloaded/ for this task."""
+    prefix = f"{task_id}_"
+    with os.scandir(DOWNLOADED_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(prefix):
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
 def download_video(task_id, url, quality, format_type):
     """
     Background download task.
     quality: e.g., "720p", "1080p", "best"
     format_type: "video+audio", "video", "audio_mp3", "audio_m4a"
     """
+    # Hold on to the task itself: it stays valid even if evicted from tasks
+    task = tasks.get(task_id)
+    if task is None:
+        return
+    
     try:
-        tasks[task_id]['status'] = 'downloading'
-        tasks[task_id]['progress'] = 0
+        task['status'] = 'downloading'
+        task['progress'] = 0
+        publish_task_update(task_id, task)
         
         # Parse quality
         height = None
@@ -303,10 +625,15 @@ def download_video(task_id, url, quality, format_type):
                 total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
                 downloaded = d.get('downloaded_bytes', 0)
                 if total > 0:
-                    tasks[task_id]['progress'] = int((downloaded / total) * 100)
+                    progress = int((downloaded / total) * 100)
+                    # Hooks fire per chunk; only publish whole-percent changes
+                    if progress != task['progress']:
+                        task['progress'] = progress
+                        publish_task_update(task_id, task)
             elif d['status'] == 'finished':
-                tasks[task_id]['status'] = 'converting'
-                tasks[task_id]['progress'] = 100
+                task['status'] = 'converting'
+                task['progress'] = 100
+                publish_task_update(task_id, task)
         
         # yt-dlp options
         ydl_opts = get_yt_dlp_opts()
@@ -319,39 +646,62 @@ def download_video(task_id, url, quality, format_type):
             'keepvideo': False,
         })
         
-        # Download
+        # Download, reusing the metadata from /info when still fresh
+        video_id = task['video_id']
+        cached_info = get_cached_video_info(video_id)
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+            info = None
+            if cached_info:
+                try:
+                    info = ydl.process_ie_result(cached_info, download=True)
+                except yt_dlp.utils.YoutubeDLError:
+                    # Cached formats may be missing (ExtractorError) or their
+                    # URLs rejected (DownloadError): forget the entry and fall
+                    # back to a fresh extraction
+                    drop_cached_video_info(video_id)
+                    remove_partial_downloads(task_id)
+                    task['status'] = 'downloading'
+                    task['progress'] = 0
+                    publish_task_update(task_id, task)
+            if info is None:
+                info = ydl.extract_info(url, download=True)
         
         # Find the downloaded file and move to converted
-        tasks[task_id]['status'] = 'converting'
+        task['status'] = 'converting'
         
-        # Look for the output file
-        downloaded_files = list(DOWNLOADED_DIR.glob(f"{task_id}_*"))
+        # Look for the output file (one directory scan; the rest are leftovers)
+        prefix = f"{task_id}_"
+        with os.scandir(DOWNLOADED_DIR) as entries:
+            downloaded_files = [Path(e.path) for e in entries if e.name.startswith(prefix)]
         if not downloaded_files:
             raise Exception("Downloaded file not found")
         
         source_file = downloaded_files[0]
         
         # Determine final filename (internal with task_id for uniqueness)
-        safe_title = re.sub(r'[^\w\s-]', '', info.get('title', 'video'))[:255].strip()
+        safe_title = _SAFE_TITLE_RE.sub('', info.get('title', 'video'))[:255].strip()
         internal_filename = f"{task_id}_{safe_title}.{final_ext}"
         final_path = CONVERTED_DIR / internal_filename
         
         # User-friendly download name (just the video title)
         download_name = f"{safe_title}.{final_ext}"
         
-        # Move file to converted directory
-        import shutil
-        shutil.move(str(source_file), str(final_path))
+        # Move file to converted directory (a rename on the same filesystem)
+        try:
+            os.replace(source_file, final_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Different devices (e.g. separate bind mounts): copy + delete
+            shutil.move(str(source_file), str(final_path))
         
         # Clean up any remaining files in downloaded
-        for f in DOWNLOADED_DIR.glob(f"{task_id}_*"):
+        for f in downloaded_files[1:]:
             f.unlink()
         
         # Save to database
         duration = info.get('duration', 0)
-        expiry_timestamp = save_download_record(
+        record_saved = save_download_record(
             task_id=task_id,
             video_id=info.get('id'),
             title=info.get('title'),
@@ -359,18 +709,28 @@ def download_video(task_id, url, quality, format_type):
             duration_seconds=duration,
             format_info=f"{quality}_{format_type}"
         )
+        try:
+            expiry_timestamp = record_saved.result()
+        except Exception:
+            # Without a row, cleanup would never delete the file
+            final_path.unlink(missing_ok=True)
+            raise
         
         # Update task status
-        tasks[task_id]['status'] = 'ready'
-        tasks[task_id]['filepath'] = str(final_path)
-        tasks[task_id]['filename'] = internal_filename
-        tasks[task_id]['download_name'] = download_name  # User-friendly name
-        tasks[task_id]['expiry'] = expiry_timestamp
-        tasks[task_id]['title'] = info.get('title')
+        task['status'] = 'ready'
+        task['filepath'] = str(final_path)
+        task['filename'] = internal_filename
+        task['download_name'] = download_name  # User-friendly name
+        task['expiry'] = expiry_timestamp
+        task['title'] = info.get('title')
+        task['finished_at'] = time.time()
+        publish_task_update(task_id, task)
         
     except Exception as e:
-        tasks[task_id]['status'] = 'error'
-        tasks[task_id]['error'] = str(e)
+        task['status'] = 'error'
+        task['error'] = str(e)
+        task['finished_at'] = time.time()
+        publish_task_update(task_id, task)
 
 # =============================================================================
 # Routes
@@ -423,6 +783,7 @@ def start_download():
     
     # Create task
     task_id = str(uuid.uuid4())[:8]
+    _MISS_CACHE.pop(task_id, None)
     tasks[task_id] = {
         'status': 'queued',
         'progress': 0,
@@ -440,7 +801,15 @@ def start_download():
 @app.route('/status/<task_id>')
 def get_status(task_id):
     """Get download status."""
-    if task_id not in tasks:
+    task = tasks.get(task_id)
+    if task is None:
+        # Reject malformed and recently-missed IDs without touching the database
+        if not _TASK_ID_RE.fullmatch(task_id):
+            return jsonify({'error': 'Task not found'}), 404
+        missed_at = _MISS_CACHE.get(task_id)
+        if missed_at and time.time() - missed_at < MISS_CACHE_TTL:
+            return jsonify({'error': 'Task not found'}), 404
+        
         # Check database for completed download
         record = get_download_record(task_id)
         if record:
@@ -449,31 +818,57 @@ def get_status(task_id):
                 'title': record['title'],
                 'expiry': record['expiry_timestamp'],
             })
+        _MISS_CACHE[task_id] = time.time()
         return jsonify({'error': 'Task not found'}), 404
     
-    task = tasks[task_id]
-    response = {
-        'status': task['status'],
-        'progress': task.get('progress', 0),
-    }
+    return jsonify(build_task_status(task))
+
+@app.route('/events/<task_id>')
+def task_events(task_id):
+    """Stream status updates as server-sent events until ready/error."""
+    task = tasks.get(task_id)
+    if task is None:
+        # Finished downloads from a previous run are still served by /status
+        return jsonify({'error': 'Task not found'}), 404
     
-    if task['status'] == 'ready':
-        response['title'] = task.get('title')
-        response['filename'] = task.get('filename')
-        response['expiry'] = task.get('expiry')
-    elif task['status'] == 'error':
-        response['error'] = task.get('error')
+    # Subscribe before taking the first snapshot so no update is missed
+    channel = queue.SimpleQueue()
+    with _task_channels_lock:
+        _task_channels.setdefault(task_id, []).append(channel)
     
-    return jsonify(response)
+    def stream():
+        try:
+            message = build_task_status(task)
+            yield f"data: {json.dumps(message)}\n\n"
+            while message['status'] not in ('ready', 'error'):
+                try:
+                    message = channel.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(message)}\n\n"
+        finally:
+            with _task_channels_lock:
+                channels = _task_channels.get(task_id, [])
+                if channel in channels:
+                    channels.remove(channel)
+                if not channels:
+                    _task_channels.pop(task_id, None)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Don't let nginx buffer the stream
+    })
 
 @app.route('/file/<task_id>')
 def download_file(task_id):
     """Serve the downloaded file."""
     # Check in-memory tasks first
-    if task_id in tasks and tasks[task_id].get('filepath'):
-        filepath = tasks[task_id]['filepath']
+    task = tasks.get(task_id)
+    if task and task.get('filepath'):
+        filepath = task['filepath']
         # Use the user-friendly download name (video title)
-        download_name = tasks[task_id].get('download_name') or tasks[task_id].get('title', 'download')
+        download_name = task.get('download_name') or task.get('title', 'download')
         # Ensure it has the correct extension
         ext = Path(filepath).suffix
         if not download_name.endswith(ext):
@@ -486,16 +881,27 @@ def download_file(task_id):
         filepath = record['filepath']
         # Use video title from database
         ext = Path(filepath).suffix
-        safe_title = re.sub(r'[^\w\s-]', '', record.get('title', 'download'))[:255].strip()
+        safe_title = _SAFE_TITLE_RE.sub('', record.get('title', 'download'))[:255].strip()
         download_name = f"{safe_title}{ext}"
     
     if not Path(filepath).exists():
         return jsonify({'error': 'File no longer exists'}), 404
     
+    # Behind nginx, hand the transfer off via X-Accel-Redirect so the
+    # worker isn't tied up streaming the file; otherwise stream it here.
+    accel_prefix = request.headers.get('X-Accel-Prefix')
+    if accel_prefix:
+        mimetype = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(Path(filepath).name)}"
+        response.headers.set('Content-Disposition', 'attachment', **content_disposition_params(download_name))
+        return response
+    
     return send_file(
         filepath,
         as_attachment=True,
-        download_name=download_name
+        download_name=download_name,
+        conditional=True
     )
 
 # =============================================================================
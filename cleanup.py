@@ -8,10 +8,13 @@ Retention = MAX(2 hours, video_duration)
 """
 
 import logging
-import sqlite3
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from db import DBPool
+
 # =============================================================================
 # Configuration
 # =============================================================================
@@ -21,6 +24,7 @@ DOWNLOADED_DIR = BASE_DIR / "downloaded"
 CONVERTED_DIR = BASE_DIR / "converted"
 DATABASE_PATH = BASE_DIR / "downloads.db"
 LOG_FILE = BASE_DIR / "cleanup.log"
+UNLINK_WORKERS = 8  # Parallel file deletions
 
 # Setup logging
 logging.basicConfig(
@@ -33,71 +37,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# One-shot cron script that only writes: no reader connections needed
+db_pool = DBPool(DATABASE_PATH, readers=0)
+
 # =============================================================================
 # Cleanup Functions
 # =============================================================================
 
-def get_expired_records():
-    """Get all records where expiry_timestamp < current time."""
+def delete_expired_records():
+    """
+    Delete all records where expiry_timestamp < current time.
+    Single transaction; returns the deleted rows so their files can be removed.
+    """
     if not DATABASE_PATH.exists():
         return []
     
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
     current_time = time.time()
-    cursor.execute('''
-        SELECT id, filepath, title, expiry_timestamp 
-        FROM downloads 
-        WHERE expiry_timestamp < ?
-    ''', (current_time,))
-    
-    records = cursor.fetchall()
-    conn.close()
-    
-    return [
-        {'id': r[0], 'filepath': r[1], 'title': r[2], 'expiry': r[3]}
-        for r in records
-    ]
+    with db_pool.writer() as conn:
+        records = conn.execute('''
+            DELETE FROM downloads 
+            WHERE expiry_timestamp < ?
+            RETURNING id, filepath, title, expiry_timestamp AS expiry
+        ''', (current_time,)).fetchall()
+    
+    return [dict(r) for r in records]
 
 def delete_file_safely(filepath):
     """Delete a file if it exists, return success status."""
-    path = Path(filepath)
-    if path.exists():
-        try:
-            path.unlink()
-            return True
-        except Exception as e:
-            logger.error(f"Failed to delete {filepath}: {e}")
-            return False
-    return True  # File already doesn't exist
-
-def remove_db_record(record_id):
-    """Remove a record from the database."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM downloads WHERE id = ?', (record_id,))
-    conn.commit()
-    conn.close()
+    try:
+        os.unlink(filepath)
+    except FileNotFoundError:
+        return True  # File already doesn't exist
+    except OSError as e:
+        logger.error(f"Failed to delete {filepath}: {e}")
+        return False
+    return True
 
 def cleanup_expired():
     """Main cleanup routine for expired files."""
     logger.info("Starting cleanup...")
     
-    expired = get_expired_records()
+    # Records are already gone from the database; a file that can't be
+    # deleted here is only logged, not re-inserted.
+    expired = delete_expired_records()
     
     if not expired:
         logger.info("No expired files found.")
         return 0
     
+    # Unlinks are independent I/O; overlap them (slow on network volumes)
+    with ThreadPoolExecutor(max_workers=UNLINK_WORKERS) as pool:
+        results = list(pool.map(delete_file_safely, [r['filepath'] for r in expired]))
+    
     deleted_count = 0
-    for record in expired:
+    for record, deleted in zip(expired, results):
         logger.info(f"Processing expired: {record['title']} (ID: {record['id']})")
         
-        # Delete the file
-        if delete_file_safely(record['filepath']):
-            # Remove from database
-            remove_db_record(record['id'])
+        if deleted:
             deleted_count += 1
             logger.info(f"Deleted: {record['filepath']}")
         else:
@@ -114,17 +110,22 @@ def cleanup_orphaned_files():
     logger.info("Checking for orphaned files in downloaded folder...")
     
     orphaned_count = 0
-    for filepath in DOWNLOADED_DIR.glob("*"):
-        if filepath.is_file():
-            # Check if file is older than 1 hour (likely orphaned)
-            age = time.time() - filepath.stat().st_mtime
-            if age > 3600:  # 1 hour
-                try:
-                    filepath.unlink()
+    now = time.time()
+    with os.scandir(DOWNLOADED_DIR) as entries:
+        for entry in entries:
+            if entry.is_file():
+                # Check if file is older than 1 hour (likely orphaned)
+                age = now - entry.stat().st_mtime
+                if age > 3600:  # 1 hour
+                    try:
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        continue  # Removed since the scan started
+                    except OSError as e:
+                        logger.error(f"Failed to delete orphaned {entry.path}: {e}")
+                        continue
                     orphaned_count += 1
-                    logger.info(f"Deleted orphaned: {filepath.name}")
-                except Exception as e:
-                    logger.error(f"Failed to delete orphaned {filepath}: {e}")
+                    logger.info(f"Deleted orphaned: {entry.name}")
     
     if orphaned_count:
         logger.info(f"Deleted {orphaned_count} orphaned files.")
@@ -143,28 +144,26 @@ def test_cleanup():
     test_file.write_text("test content")
     
     # Create expired DB record
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS downloads (
-            id TEXT PRIMARY KEY,
-            video_id TEXT,
-            title TEXT,
-            filepath TEXT,
-            duration_seconds INTEGER,
-            expiry_timestamp REAL,
-            format_info TEXT,
-            status TEXT,
-            created_at REAL
-        )
-    ''')
-    cursor.execute('''
-        INSERT INTO downloads 
-        (id, video_id, title, filepath, duration_seconds, expiry_timestamp, format_info, status, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (test_id, 'test123', 'Test Video', str(test_file), 60, time.time() - 100, 'test', 'ready', time.time()))
-    conn.commit()
-    conn.close()
+    with db_pool.writer() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS downloads (
+                id TEXT PRIMARY KEY,
+                video_id TEXT,
+                title TEXT,
+                filepath TEXT,
+                duration_seconds INTEGER,
+                expiry_timestamp REAL,
+                format_info TEXT,
+                status TEXT,
+                created_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_expiry ON downloads(expiry_timestamp)')
+        conn.execute('''
+            INSERT INTO downloads 
+            (id, video_id, title, filepath, duration_seconds, expiry_timestamp, format_info, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (test_id, 'test123', 'Test Video', str(test_file), 60, time.time() - 100, 'test', 'ready', time.time()))
     
     logger.info(f"Created test file: {test_file}")
     
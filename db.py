@@ -0,0 +1,103 @@
+"""
+YouTube Downloader - SQLite Connection Pool
+Shared by app.py and cleanup.py: long-lived WAL-mode connections
+(1 writer + N readers) instead of a fresh sqlite3.connect() per query.
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# =============================================================================
+# Configuration
+# =============================================================================
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-8000',        # 8 MB page cache per connection
+    'PRAGMA mmap_size=134217728',     # 128 MB memory-mapped I/O
+)
+
+# SQLite allows a single writer; serialize writers in-process so they queue
+# here instead of holding a connection while waiting on the database lock.
+_WRITE_LOCK = threading.Lock()
+
+# =============================================================================
+# Connection Pool
+# =============================================================================
+
+class DBPool:
+    """
+    Pool of long-lived SQLite connections: one writer, several readers.
+    Connections are opened lazily on first use (so forked workers each
+    get their own) and are never closed. Rows come back as sqlite3.Row.
+    """
+
+    def __init__(self, database_path, readers=4):
+        self.database_path = database_path
+        self.readers = readers
+        self._reader_q = queue.Queue()
+        self._writer_q = queue.Queue()
+        self._open_lock = threading.Lock()
+        self._opened = False
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database_path,
+            check_same_thread=False,
+            isolation_level=None,  # autocommit; transactions are explicit
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _open(self):
+        with self._open_lock:
+            if self._opened:
+                return
+            # Writer first, so journal_mode=WAL is set before readers attach
+            self._writer_q.put(self._connect())
+            for _ in range(self.readers):
+                self._reader_q.put(self._connect())
+            self._opened = True
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection."""
+        if not self._opened:
+            self._open()
+        conn = self._reader_q.get()
+        try:
+            yield conn
+        finally:
+            self._reader_q.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """
+        Borrow the single writer connection inside a transaction.
+        Commits on exit, rolls back if the block raises.
+        """
+        if not self._opened:
+            self._open()
+        with _WRITE_LOCK:
+            conn = self._writer_q.get()
+            try:
+                # IMMEDIATE takes the write lock up front, so a concurrent
+                # writer in another process fails fast (after busy timeout)
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    yield conn
+                    conn.execute('COMMIT')
+                except BaseException:
+                    # SQLite may already have rolled back (e.g. failed COMMIT);
+                    # never hand the connection back with a transaction open
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    raise
+            finally:
+                self._writer_q.put(conn)